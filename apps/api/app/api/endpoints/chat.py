@@ -1,21 +1,77 @@
-import json
+import asyncio
+from typing import Any, AsyncIterator, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 
+from app.core.config import settings
+from app.core.streaming import Prefetcher
 from app.dependencies import get_rag_pipeline
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.services.rag import RAGPipeline
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+DISCONNECT_POLL_INTERVAL = 16
+
+
+async def coalesce_ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Encode events as NDJSON and pack consecutive lines into a single chunk.
+
+    The first batch flushes after ``stream_batch_min`` events so the first token is
+    not delayed; each following batch grows by ``stream_batch_growth`` up to
+    ``stream_batch_max``. A partially filled batch is flushed once it has waited
+    ``stream_flush_interval_ms`` for the next event.
+    """
+
+    loop = asyncio.get_running_loop()
+    flush_interval = settings.stream_flush_interval_ms / 1000
+    batch_limit = max(settings.stream_batch_min, 1)
+    buffer = bytearray()
+    buffered = 0
+    deadline = 0.0
+
+    items = Prefetcher(events)
+    try:
+        while True:
+            timeout = max(deadline - loop.time(), 0.0) if buffered else None
+            try:
+                event = await items.next(timeout)
+            except TimeoutError:
+                yield bytes(buffer)
+                buffer.clear()
+                buffered = 0
+                continue
+            except StopAsyncIteration:
+                break
+
+            buffer += orjson.dumps(event)
+            buffer += b"\n"
+            buffered += 1
+            if buffered == 1:
+                deadline = loop.time() + flush_interval
+
+            if buffered >= batch_limit:
+                yield bytes(buffer)
+                buffer.clear()
+                buffered = 0
+                batch_limit = min(batch_limit * settings.stream_batch_growth, settings.stream_batch_max)
+    finally:
+        # Stops the upstream generator and waits for its cleanup (LLM stream, DB session).
+        await items.aclose()
+
+    if buffer:
+        yield bytes(buffer)
+
 
 @router.post("", response_model=ChatResponse)
 async def create_chat_completion(
     request: ChatRequest,
     pipeline: RAGPipeline = Depends(get_rag_pipeline),
 ) -> ChatResponse:
-    if not request.question.strip():
+    if not request.question:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Question cannot be empty.")
 
     try:
@@ -27,16 +83,26 @@ async def create_chat_completion(
 @router.post("/stream")
 async def stream_chat_completion(
     request: ChatRequest,
+    http_request: Request,
     pipeline: RAGPipeline = Depends(get_rag_pipeline),
 ) -> StreamingResponse:
-    if not request.question.strip():
+    if not request.question:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Question cannot be empty.")
 
-    async def event_generator():
+    async def event_generator() -> AsyncIterator[Dict[str, Any]]:
+        events = pipeline.stream(request)
+        emitted = 0
         try:
-            async for event in pipeline.stream(request):
-                yield f"{json.dumps(event, ensure_ascii=False)}\n"
+            async for event in events:
+                yield event
+                emitted += 1
+                # Stop pulling from the LLM once the browser has gone away.
+                if emitted % DISCONNECT_POLL_INTERVAL == 0 and await http_request.is_disconnected():
+                    break
         except Exception as exc:  # noqa: BLE001
-            yield f'{json.dumps({"type": "error", "error": str(exc)})}\n'
+            yield {"type": "error", "error": str(exc)}
+        finally:
+            # Runs on disconnect and cancellation too, closing the upstream stream promptly.
+            await events.aclose()
 
-    return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+    return StreamingResponse(coalesce_ndjson(event_generator()), media_type="application/x-ndjson")
@@ -1,11 +1,9 @@
 from typing import List, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.dependencies import get_db_session, get_embedding_service
+from app.dependencies import get_document_retriever
 from app.schemas.documents import DocumentChunkPayload, DocumentIngestRequest, DocumentIngestResponse
-from app.services.embeddings import EmbeddingService
 from app.services.retriever import DocumentRetriever
 
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -54,11 +52,8 @@ def build_chunks(request: DocumentIngestRequest) -> List[Tuple[str, str, dict]]:
 @router.post("", response_model=DocumentIngestResponse)
 async def ingest_problem_document(
     request: DocumentIngestRequest,
-    session: AsyncSession = Depends(get_db_session),
-    embeddings: EmbeddingService = Depends(get_embedding_service),
+    retriever: DocumentRetriever = Depends(get_document_retriever),
 ) -> DocumentIngestResponse:
-    retriever = DocumentRetriever(session=session, embeddings=embeddings)
-
     chunks = build_chunks(request)
     await retriever.upsert(
         slug=request.slug,
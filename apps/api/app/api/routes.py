@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 
 from app.api import api_router
 from app.api.endpoints.chat import router as chat_router
@@ -7,7 +8,7 @@ from app.api.endpoints.documents import router as documents_router
 router = APIRouter()
 
 
-@router.get("/health", tags=["health"])
+@router.get("/health", tags=["health"], response_class=ORJSONResponse)
 async def health_check() -> dict[str, str]:
     """
     Basic health-check endpoint used by orchestrators and smoke tests.
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+class Prefetcher(Generic[T]):
+    """
+    Drains an async iterator from one background task into a bounded queue.
+
+    A single task drives the source for its whole lifetime, so context variables set
+    inside it persist between items, and readers can wait for the next item with a
+    timeout without spawning a task per item. :meth:`aclose` cancels and awaits that
+    task and then closes the source, so upstream cleanup runs before it returns.
+    """
+
+    def __init__(self, source: AsyncIterator[T], maxsize: int = 64) -> None:
+        self._source = source
+        self._queue: asyncio.Queue[object] = asyncio.Queue(maxsize=maxsize)
+        self._task = asyncio.create_task(self._pump())
+        self._finished = False
+        self._held: object | None = None
+
+    async def _pump(self) -> None:
+        try:
+            async for item in self._source:
+                await self._queue.put(item)
+        except Exception as exc:  # noqa: BLE001 - re-raised to the reader
+            await self._queue.put(_Failure(exc))
+            return
+        await self._queue.put(_END)
+
+    async def next(self, timeout: float | None = None) -> T:
+        """
+        Return the next item; raises ``TimeoutError`` if none arrives in time and
+        ``StopAsyncIteration`` once the source is exhausted.
+        """
+
+        if self._finished:
+            raise StopAsyncIteration
+        if self._held is not None:
+            item, self._held = self._held, None
+        else:
+            async with asyncio.timeout(timeout):
+                item = await self._queue.get()
+        if item is _END:
+            self._finished = True
+            raise StopAsyncIteration
+        if isinstance(item, _Failure):
+            self._finished = True
+            raise item.exc
+        return item  # type: ignore[return-value]
+
+    def ready(self) -> List[T]:
+        """
+        Return the items already queued, without waiting for more.
+        """
+
+        items: List[T] = []
+        while self._held is None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is _END or isinstance(item, _Failure):
+                # Replayed by the next call to next().
+                self._held = item
+                break
+            items.append(item)  # type: ignore[arg-type]
+        return items
+
+    async def aclose(self) -> None:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        aclose = getattr(self._source, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -1,3 +1,3 @@
-from .session import engine, get_session, SessionLocal
+from .session import engine, get_session, ingest_engine, IngestSessionLocal, SessionLocal
 
-__all__ = ["engine", "get_session", "SessionLocal"]
+__all__ = ["engine", "get_session", "ingest_engine", "IngestSessionLocal", "SessionLocal"]
@@ -4,6 +4,9 @@ from app.db.base import Base
 from app.db.session import engine
 from app import models  # noqa: F401 -- ensure models are registered with metadata
 
+# Arbitrary key shared by every worker so only one of them runs the DDL at a time.
+INIT_DB_LOCK_ID = 7_358_200_914
+
 
 async def init_db() -> None:
     """
@@ -11,5 +14,9 @@ async def init_db() -> None:
     """
 
     async with engine.begin() as connection:
+        await connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": INIT_DB_LOCK_ID})
         await connection.execute(text('CREATE EXTENSION IF NOT EXISTS "vector";'))
         await connection.run_sync(Base.metadata.create_all)
+        # Searches are filtered to one slug (a handful of rows via its btree index), so an
+        # exact scan beats an ANN index; drop the one earlier builds created.
+        await connection.execute(text("DROP INDEX IF EXISTS ix_documents_embedding_hnsw;"))
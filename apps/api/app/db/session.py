@@ -5,11 +5,28 @@ from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
 from app.core.config import settings
 
-engine: AsyncEngine = create_async_engine(
-    settings.database_url,
-    echo=settings.sqlalchemy_echo,
-    future=True,
-)
+
+def _create_engine(pool_size: int, max_overflow: int) -> AsyncEngine:
+    return create_async_engine(
+        settings.database_url,
+        echo=settings.sqlalchemy_echo,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=settings.db_pool_recycle_s,
+        pool_pre_ping=True,
+        connect_args={
+            "server_settings": {
+                # JIT compilation only adds planning time to the short pgvector lookups we run.
+                "jit": "off",
+            },
+        },
+    )
+
+
+engine: AsyncEngine = _create_engine(settings.db_pool_size, settings.db_max_overflow)
+# Ingestion gets its own small pool so bulk upserts cannot starve chat lookups of connections.
+ingest_engine: AsyncEngine = _create_engine(settings.db_ingest_pool_size, settings.db_ingest_max_overflow)
 
 SessionLocal = async_sessionmaker(
     bind=engine,
@@ -17,6 +34,12 @@ SessionLocal = async_sessionmaker(
     expire_on_commit=False,
 )
 
+IngestSessionLocal = async_sessionmaker(
+    bind=ingest_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 
 @asynccontextmanager
 async def get_session() -> AsyncIterator[AsyncSession]:
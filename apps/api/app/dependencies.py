@@ -1,49 +1,73 @@
-from collections.abc import AsyncIterator
 from functools import lru_cache
 
-from fastapi import Depends
+from langchain_openai import ChatOpenAI
 from redis import asyncio as aioredis
 from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.session import get_session
+from app.db.session import IngestSessionLocal, SessionLocal
 from app.services.cache import CacheService
 from app.services.embeddings import EmbeddingService
 from app.services.rag import RAGPipeline
 from app.services.retriever import DocumentRetriever
+from app.services.semantic_cache import SemanticCache
 
 
-async def get_db_session() -> AsyncIterator[AsyncSession]:
-    async with get_session() as session:
-        yield session
+@lru_cache
+def get_redis_client() -> Redis:
+    return aioredis.from_url(settings.redis_url, decode_responses=False)
 
 
-_redis_client: Redis | None = None
+@lru_cache
+def get_cache_service() -> CacheService:
+    # Shared so the in-process L1 outlives a request.
+    return CacheService(get_redis_client())
 
 
-async def get_redis_client() -> Redis:
-    global _redis_client  # noqa: PLW0603 - module-level cache is intentional
-    if _redis_client is None:
-        _redis_client = aioredis.from_url(settings.redis_url, decode_responses=True)
-    return _redis_client
+@lru_cache
+def get_semantic_cache() -> SemanticCache:
+    return SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        max_entries_per_slug=settings.semantic_cache_max_entries,
+        max_slugs=settings.semantic_cache_max_slugs,
+        ttl_seconds=settings.cache_ttl_seconds,
+    )
 
 
-async def get_cache_service(
-    redis_client=Depends(get_redis_client),
-) -> CacheService:
-    return CacheService(redis_client)
+@lru_cache
+def get_embedding_service() -> EmbeddingService:
+    return EmbeddingService(redis=get_redis_client())
 
 
 @lru_cache
-def get_embedding_service() -> EmbeddingService:
-    return EmbeddingService()
+def get_chat_llm() -> ChatOpenAI:
+    # No streaming=True: astream() streams regardless, and ainvoke() then gets one plain response.
+    return ChatOpenAI(
+        temperature=0.0,
+        model=settings.openai_model,
+        openai_api_key=settings.openai_api_key,
+    )
 
 
-async def get_rag_pipeline(
-    session: AsyncSession = Depends(get_db_session),
-    embeddings: EmbeddingService = Depends(get_embedding_service),
-    cache: CacheService = Depends(get_cache_service),
-) -> RAGPipeline:
-    retriever = DocumentRetriever(session=session, embeddings=embeddings)
-    return RAGPipeline(retriever=retriever, cache=cache)
+@lru_cache
+def get_document_retriever() -> DocumentRetriever:
+    return DocumentRetriever(
+        embeddings=get_embedding_service(),
+        session_factory=SessionLocal,
+        ingest_session_factory=IngestSessionLocal,
+    )
+
+
+@lru_cache
+def get_rag_pipeline() -> RAGPipeline:
+    """
+    Process-wide pipeline; database sessions are opened by the retriever per query.
+    """
+
+    return RAGPipeline(
+        retriever=get_document_retriever(),
+        embeddings=get_embedding_service(),
+        cache=get_cache_service(),
+        semantic_cache=get_semantic_cache(),
+        llm=get_chat_llm(),
+    )
@@ -1,10 +1,26 @@
+import asyncio
+import os
+from collections.abc import Callable
+from typing import Any
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from prometheus_client import CollectorRegistry, make_asgi_app, multiprocess
 
 from app.api import api_router
 from app.core.config import settings
 from app.core.logging import configure_logging
 from app.db.init_db import init_db
+from app.dependencies import get_rag_pipeline
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - uvloop is unavailable on Windows
+    pass
+else:
+    # Covers launchers that do not pass ``--loop uvloop`` themselves.
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 configure_logging()
 
@@ -13,6 +29,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
 )
 
 if settings.cors_origins or settings.cors_origin_regex:
@@ -28,7 +45,19 @@ if settings.cors_origins or settings.cors_origin_regex:
 app.include_router(api_router, prefix=settings.api_v1_prefix)
 
 
-@app.get("/healthz", tags=["health"])
+def _metrics_app() -> Callable[..., Any]:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return make_asgi_app()
+    # Several workers: merge the samples each one writes to the shared directory.
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry=registry)
+
+
+app.mount("/metrics", _metrics_app())
+
+
+@app.get("/healthz", tags=["health"], response_class=ORJSONResponse)
 async def healthz() -> dict[str, str]:
     """
     Light-weight liveness probe.
@@ -40,3 +69,10 @@ async def healthz() -> dict[str, str]:
 @app.on_event("startup")
 async def on_startup() -> None:
     await init_db()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # Skip building the pipeline (and its clients) just to close it.
+    if get_rag_pipeline.cache_info().currsize:
+        await get_rag_pipeline().aclose()
@@ -6,6 +6,7 @@ from sqlalchemy import DateTime, Integer, String, Text, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
+from app.core.config import settings
 from app.db.base import Base
 
 
@@ -17,7 +18,7 @@ class Document(Base):
     title: Mapped[str] = mapped_column(String(512))
     content: Mapped[str] = mapped_column(Text)
     metadata_json: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, default=dict)
-    embedding: Mapped[List[float]] = mapped_column(Vector(3072))
+    embedding: Mapped[List[float]] = mapped_column(Vector(settings.embedding_dimensions))
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
 
 
 class ChatMessage(BaseModel):
@@ -21,10 +21,12 @@ class ProblemPayload(BaseModel):
 class SourceDocument(BaseModel):
     title: str
     snippet: str
-    metadata: dict = Field(default_factory=dict)
+    metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     question: str
     problem: ProblemPayload
     history: List[ChatMessage] = Field(default_factory=list)
@@ -2,10 +2,12 @@ from app.services.cache import CacheService
 from app.services.embeddings import EmbeddingService
 from app.services.rag import RAGPipeline
 from app.services.retriever import DocumentRetriever
+from app.services.semantic_cache import SemanticCache
 
 __all__ = [
     "CacheService",
     "EmbeddingService",
     "RAGPipeline",
     "DocumentRetriever",
+    "SemanticCache",
 ]
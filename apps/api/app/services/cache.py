@@ -1,34 +1,75 @@
 from __future__ import annotations
 
-import json
-from hashlib import sha256
 from typing import Any, Dict, Optional
 
+import msgpack
+import orjson
+import xxhash
+import zstandard as zstd
+from cachetools import TTLCache
+from prometheus_client import Counter
 from redis.asyncio import Redis
 
 from app.core.config import settings
 
+_zctx = zstd.ZstdCompressor(level=3)
+_zdctx = zstd.ZstdDecompressor()
+
+L1_MAX_TTL_SECONDS = 60
+
+CACHE_LOOKUPS = Counter(
+    "chat_cache_lookups_total",
+    "Chat response cache lookups by tier and outcome.",
+    ["tier", "result"],
+)
+
 
 class CacheService:
     """
     Thin wrapper around Redis for namespaced caching of chat responses.
+
+    Values are stored as zstd-compressed msgpack, so the client must be created
+    with ``decode_responses=False``. A small in-process TTL cache (L1) sits in
+    front of Redis (L2), so one instance should be shared across requests.
     """
 
     def __init__(self, client: Redis) -> None:
         self._client = client
         self._ttl = settings.cache_ttl_seconds
+        self._l1: TTLCache[str, Dict[str, Any]] = TTLCache(
+            maxsize=settings.cache_l1_maxsize,
+            ttl=min(L1_MAX_TTL_SECONDS, self._ttl),
+        )
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return " ".join(question.split()).casefold()
 
     @staticmethod
     def build_key(slug: str, payload: Dict[str, Any]) -> str:
-        serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False)
-        digest = sha256(serialized.encode("utf-8")).hexdigest()
+        if settings.cache_normalize_question and "question" in payload:
+            payload = {**payload, "question": CacheService.normalize_question(payload["question"])}
+        # Keys only need to be stable and collision-resistant, not cryptographic.
+        digest = xxhash.xxh3_128_hexdigest(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
         return f"chat:{slug}:{digest}"
 
     async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        cached = self._l1.get(key)
+        if cached is not None:
+            CACHE_LOOKUPS.labels(tier="l1", result="hit").inc()
+            return cached
+        CACHE_LOOKUPS.labels(tier="l1", result="miss").inc()
+
         value = await self._client.get(key)
         if value is None:
+            CACHE_LOOKUPS.labels(tier="l2", result="miss").inc()
             return None
-        return json.loads(value)
+        CACHE_LOOKUPS.labels(tier="l2", result="hit").inc()
+
+        data = msgpack.unpackb(_zdctx.decompress(value))
+        self._l1[key] = data
+        return data
 
     async def set(self, key: str, data: Dict[str, Any]) -> None:
-        await self._client.set(key, json.dumps(data), ex=self._ttl)
+        self._l1[key] = data
+        await self._client.set(key, _zctx.compress(msgpack.packb(data)), ex=self._ttl)
@@ -1,29 +1,219 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+from typing import Awaitable, Callable, List, Set, Tuple
 
+import numpy as np
+import xxhash
+from async_lru import alru_cache
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
+from redis.asyncio import Redis
 
 from app.core.config import settings
 
 
+class OnnxEmbeddings(Embeddings):
+    """
+    Local CPU encoder for BGE-style models exported to ONNX (ideally INT8-quantized).
+
+    Uses CLS pooling with L2 normalisation. The async methods inherited from
+    ``Embeddings`` run inference in the default executor, off the event loop.
+    """
+
+    def __init__(self, model_name: str, file_name: str, dimensions: int, max_length: int = 512) -> None:
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=onnx requires optimum[onnxruntime]. Install it with `pip install optimum[onnxruntime]`.",
+            ) from exc
+
+        self._max_length = max_length
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._model = ORTModelForFeatureExtraction.from_pretrained(
+            model_name,
+            file_name=file_name,
+            provider="CPUExecutionProvider",
+        )
+
+        hidden_size = self._model.config.hidden_size
+        if hidden_size != dimensions:
+            raise RuntimeError(
+                f"{model_name} produces {hidden_size}-dim vectors but EMBEDDING_DIMENSIONS is {dimensions}.",
+            )
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        tokens = self._tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self._max_length,
+            return_tensors="np",
+        )
+        outputs = self._model(**tokens)
+        cls = np.asarray(outputs.last_hidden_state)[:, 0]
+        cls /= np.linalg.norm(cls, axis=1, keepdims=True)
+        return cls.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+class _MicroBatcher:
+    """
+    Coalesces concurrent single-text embedding calls into batched upstream requests.
+
+    The first queued text opens a window of ``max_wait`` seconds; everything that
+    arrives before it closes (up to ``max_batch`` texts) is embedded in one call.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch: int,
+        max_wait: float,
+    ) -> None:
+        self._embed = embed
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: asyncio.Queue[Tuple[str, asyncio.Future[List[float]]]] | None = None
+        self._collector: asyncio.Task[None] | None = None
+        self._in_flight: Set[asyncio.Task[None]] = set()
+
+    async def submit(self, text: str) -> List[float]:
+        if self._collector is None or self._collector.done():
+            # Started lazily so the queue and task belong to the running loop.
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+
+        future: asyncio.Future[List[float]] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Flush in the background so the next window can open while this one is in flight.
+            task = asyncio.create_task(self._flush(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future[List[float]]]]) -> None:
+        pending = [(text, future) for text, future in batch if not future.done()]
+        if not pending:
+            return
+
+        try:
+            vectors = await self._embed([text for text, _ in pending])
+            if len(vectors) != len(pending):
+                raise RuntimeError(f"Embedding backend returned {len(vectors)} vectors for {len(pending)} texts.")
+            for (_, future), vector in zip(pending, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as exc:  # noqa: BLE001 - surfaced to every waiting caller
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            # Only reached unresolved when interrupted (e.g. cancelled at shutdown); no caller may hang.
+            for _, future in pending:
+                if not future.done():
+                    future.cancel()
+
+
 class EmbeddingService:
     """
-    Provides access to OpenAI embeddings for queries and documents.
+    Provides access to embeddings for queries and documents.
+
+    ``EMBEDDING_BACKEND`` selects OpenAI (default) or a local ONNX encoder. The same
+    backend must serve ingestion and queries so that both live in one vector space.
+
+    Query embeddings are cached in-process and, when a Redis client is given, in
+    Redis as float16 bytes so other workers can reuse them.
     """
 
-    def __init__(self) -> None:
-        if not settings.openai_api_key:
-            raise RuntimeError("OPENAI_API_KEY is not configured. Update apps/api/.env before running the service.")
+    def __init__(self, redis: Redis | None = None) -> None:
+        self._redis = redis
+        if settings.embedding_backend == "onnx":
+            self._model = settings.onnx_embedding_model
+            self._embedder: Embeddings = OnnxEmbeddings(
+                model_name=self._model,
+                file_name=settings.onnx_embedding_file,
+                dimensions=settings.embedding_dimensions,
+            )
+        else:
+            if not settings.openai_api_key:
+                raise RuntimeError("OPENAI_API_KEY is not configured. Update apps/api/.env before running the service.")
+
+            self._model = settings.embedding_model
+            self._embedder = OpenAIEmbeddings(
+                model=self._model,
+                openai_api_key=settings.openai_api_key,
+            )
 
-        self._model = settings.embedding_model
-        self._embedder = OpenAIEmbeddings(
-            model=self._model,
-            openai_api_key=settings.openai_api_key,
+        self._batcher = _MicroBatcher(
+            self._embedder.aembed_documents,
+            max_batch=settings.embedding_batch_max_size,
+            max_wait=settings.embedding_batch_max_wait_ms / 1000,
         )
 
+    def _redis_key(self, text: str) -> str:
+        return f"emb:v1:{self._model}:{xxhash.xxh3_128_hexdigest(text.encode('utf-8'))}"
+
+    @alru_cache(maxsize=settings.embedding_cache_maxsize)
     async def embed_query(self, text: str) -> List[float]:
-        return await self._embedder.aembed_query(text)
+        if self._redis is None:
+            return await self._batcher.submit(text)
+
+        key = self._redis_key(text)
+        packed = await self._redis.get(key)
+        if packed is not None:
+            return np.frombuffer(packed, dtype=np.float16).astype(np.float32).tolist()
+
+        vector = await self._batcher.submit(text)
+        await self._redis.set(
+            key,
+            np.asarray(vector, dtype=np.float16).tobytes(),
+            ex=settings.embedding_cache_ttl_seconds,
+        )
+        return vector
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed several query-side texts; they share upstream requests with concurrent callers.
+        """
+
+        return list(await asyncio.gather(*(self.embed_query(text) for text in texts)))
 
     async def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return await self._embedder.aembed_documents(texts)
+        """
+        Embed ingestion texts in ``EMBEDDING_DOCUMENT_BATCH_SIZE`` slices, at most
+        ``EMBEDDING_DOCUMENT_CONCURRENCY`` of them in flight at once.
+        """
+
+        size = settings.embedding_document_batch_size
+        # Bounded so a large document neither trips provider rate limits nor floods the ONNX executor.
+        limit = asyncio.Semaphore(settings.embedding_document_concurrency)
+
+        async def embed_slice(start: int) -> list[list[float]]:
+            async with limit:
+                return await self._embedder.aembed_documents(texts[start : start + size])
+
+        batches = await asyncio.gather(*(embed_slice(start) for start in range(0, len(texts), size)))
+        return [vector for batch in batches for vector in batch]
@@ -1,140 +1,324 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import textwrap
-from typing import Any, AsyncIterator, Dict, List, TypedDict
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Set, Tuple
 
-from langchain.prompts import ChatPromptTemplate
+import numpy as np
+from langchain_core.messages import BaseMessage, BaseMessageChunk, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
-from app.core.config import settings
+
+from app.core.streaming import Prefetcher
 from app.schemas.chat import ChatRequest, ChatResponse, SourceDocument
 from app.services.cache import CacheService
+from app.services.embeddings import EmbeddingService
 from app.services.retriever import DocumentChunk, DocumentRetriever
+from app.services.semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+QUESTION_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.3
+HISTORY_WEIGHT = 0.1
+
+# The OpenAI client's pool drops keep-alive connections idle for 5s; warm up just before that.
+LLM_WARMUP_IDLE_SECONDS = 4.0
+
+# The model writes its answer and summary in one completion, separated by this line.
+SUMMARY_DELIMITER = "---SUMMARY---"
+
+_ANSWER_SYSTEM_PROMPT = textwrap.dedent(
+    """
+    You are an elite software engineering mentor helping users solve LeetCode problems.
+    Always follow the learner's most recent instructions exactly.
+    Use the retrieved contextual snippets only when they are relevant to the question.
+    Keep responses sharply focused on the request — avoid restating the entire problem or adding unsolicited details.
+    If the learner explicitly asks for code-only, respond with a single fenced code block in the requested language and no additional commentary.
+    Otherwise, answer with concise Markdown that covers only what is necessary to address the question (step-by-step guidance, short clarifications, or targeted tips).
+    Never invent information that is not supported by the retrieved context or the question.
+
+    After the answer, write a line containing only {summary_delimiter} and then summarise your answer in two or three concise Markdown bullet points.
+    Each bullet must be short (max 16 words) and highlight a key insight, strategy, or next step.
+    """,
+).strip()
+
+_ANSWER_HUMAN_PROMPT = textwrap.dedent(
+    """
+    Problem:
+    Title: {problem_title}
+    Difficulty: {difficulty}
+    URL: {url}
+
+    Canonical description:
+    {problem_description}
+
+    Recent conversation:
+    {history}
+
+    Retrieved snippets:
+    {context}
 
+    Learner's latest question:
+    {question}
+    """,
+).strip()
 
-class PipelineState(TypedDict, total=False):
+ANSWER_SYSTEM_MESSAGE = SystemMessage(content=_ANSWER_SYSTEM_PROMPT.format(summary_delimiter=SUMMARY_DELIMITER))
+
+
+@dataclass(slots=True)
+class PipelineState:
     question: str
     problem: Dict[str, Any]
     history: List[Dict[str, str]]
-    context: List[DocumentChunk]
-    answer: str
-    summary: str
-    sources: List[SourceDocument]
+    question_vector: List[float] = field(default_factory=list)
+    query_vector: List[float] = field(default_factory=list)
+    context: List[DocumentChunk] = field(default_factory=list)
+
+
+def fuse_vectors(vectors: Sequence[Sequence[float]], weights: Sequence[float]) -> List[float]:
+    """
+    Collapse several embeddings into one unit-length query vector by weighted mean.
+    """
+
+    fused = np.average(np.asarray(vectors, dtype=np.float32), axis=0, weights=weights)
+    norm = np.linalg.norm(fused)
+    if norm:
+        fused /= norm
+    return fused.tolist()
+
+
+def _coerce_content(chunk: BaseMessageChunk) -> str:
+    """
+    Flatten message content that is not a plain string (e.g. a list of content parts) to text.
+    """
+
+    if isinstance(chunk.content, str):
+        return chunk.content
+    if isinstance(chunk.content, list):
+        return "".join(
+            [part.get("text", "") if isinstance(part, dict) else getattr(part, "text", str(part)) for part in chunk.content],
+        )
+    text = getattr(chunk, "text", "")
+    return text if isinstance(text, str) else ""
+
+
+def split_answer(text: str) -> Tuple[str, str]:
+    """
+    Split a completion into its answer and summary; the summary is empty if the delimiter is missing.
+    """
+
+    answer, _, summary = text.partition(SUMMARY_DELIMITER)
+    return answer.strip(), summary.strip()
+
+
+async def batch_tokens(pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Forward streamed text pieces, merging any that queued up while the consumer was busy.
+
+    Nothing is held back waiting for more text: a piece that arrives on its own is
+    sent on its own, and time-based batching is left to the NDJSON encoder.
+    """
+
+    prefetcher = Prefetcher(pieces)
+    try:
+        while True:
+            try:
+                piece = await prefetcher.next()
+            except StopAsyncIteration:
+                break
+            ready = prefetcher.ready()
+            yield piece + "".join(ready) if ready else piece
+    finally:
+        await prefetcher.aclose()
+
+
+class AnswerStreamSplitter:
+    """
+    Separates streamed answer tokens from the trailing summary.
+
+    Text that could still turn out to be the start of the delimiter is held back
+    until the next token settles it, so the delimiter itself is never emitted.
+    """
+
+    def __init__(self) -> None:
+        self._answer_parts: List[str] = []
+        self._summary_parts: List[str] = []
+        self._pending = ""
+        self._in_summary = False
+
+    @staticmethod
+    def _partial_delimiter_length(text: str) -> int:
+        for length in range(min(len(text), len(SUMMARY_DELIMITER) - 1), 0, -1):
+            if text.endswith(SUMMARY_DELIMITER[:length]):
+                return length
+        return 0
+
+    def feed(self, piece: str) -> str:
+        """
+        Consume one streamed piece and return the answer text that is safe to emit.
+        """
+
+        if self._in_summary:
+            self._summary_parts.append(piece)
+            return ""
+
+        text = self._pending + piece
+        head, found, tail = text.partition(SUMMARY_DELIMITER)
+        if found:
+            self._in_summary = True
+            self._pending = ""
+            self._summary_parts.append(tail)
+        else:
+            held = self._partial_delimiter_length(text)
+            head, self._pending = text[: len(text) - held], text[len(text) - held :]
+
+        self._answer_parts.append(head)
+        return head
+
+    def finish(self) -> str:
+        """
+        Release any held-back text once the stream has ended.
+        """
+
+        tail, self._pending = self._pending, ""
+        self._answer_parts.append(tail)
+        return tail
+
+    @property
+    def answer(self) -> str:
+        return "".join(self._answer_parts).strip()
+
+    @property
+    def summary(self) -> str:
+        return "".join(self._summary_parts).strip()
 
 
 class RAGPipeline:
-    def __init__(self, retriever: DocumentRetriever, cache: CacheService) -> None:
+    def __init__(
+        self,
+        retriever: DocumentRetriever,
+        embeddings: EmbeddingService,
+        cache: CacheService,
+        semantic_cache: SemanticCache,
+        llm: ChatOpenAI,
+    ) -> None:
         self._retriever = retriever
+        self._embeddings = embeddings
         self._cache = cache
-        self._answer_llm = ChatOpenAI(
-            temperature=0.0,
-            model=settings.openai_model,
-            openai_api_key=settings.openai_api_key,
-            streaming=True,
-        )
-        self._summary_llm = ChatOpenAI(
-            temperature=0.0,
-            model=settings.openai_model,
-            openai_api_key=settings.openai_api_key,
-        )
-        self._answer_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    textwrap.dedent(
-                        """
-                        You are an elite software engineering mentor helping users solve LeetCode problems.
-                        Always follow the learner's most recent instructions exactly.
-                        Use the retrieved contextual snippets only when they are relevant to the question.
-                        Keep responses sharply focused on the request — avoid restating the entire problem or adding unsolicited details.
-                        If the learner explicitly asks for code-only, respond with a single fenced code block in the requested language and no additional commentary.
-                        Otherwise, answer with concise Markdown that covers only what is necessary to address the question (step-by-step guidance, short clarifications, or targeted tips).
-                        Never invent information that is not supported by the retrieved context or the question.
-                        """,
-                    ).strip(),
-                ),
-                (
-                    "human",
-                    textwrap.dedent(
-                        """
-                        Problem:
-                        Title: {problem_title}
-                        Difficulty: {difficulty}
-                        URL: {url}
-
-                        Canonical description:
-                        {problem_description}
-
-                        Retrieved snippets:
-                        {context}
-
-                        Recent conversation:
-                        {history}
-
-                        Learner's latest question:
-                        {question}
-                        """,
-                    ).strip(),
-                ),
-            ],
-        )
-        self._summary_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    textwrap.dedent(
-                        """
-                        Summarise the mentor's answer into two or three concise bullet points.
-                        Each bullet must be short (max 16 words) and highlight a key insight, strategy, or next step.
-                        Output only the bullet list in Markdown.
-                        """,
-                    ).strip(),
-                ),
-                (
-                    "human",
-                    textwrap.dedent(
-                        """
-                        Problem: {problem_title} ({difficulty})
-                        Learner question: {question}
-
-                        Mentor answer:
-                        {answer}
-                        """,
-                    ).strip(),
-                ),
-            ],
+        self._semantic_cache = semantic_cache
+        self._llm = llm
+        self._llm_last_used = float("-inf")
+        self._background: Set[asyncio.Task[None]] = set()
+
+    @staticmethod
+    def _initial_state(request: ChatRequest, history: List[Dict[str, str]]) -> PipelineState:
+        # The problem (with its full description) is only dumped once the cache has missed.
+        return PipelineState(
+            question=request.question,
+            problem=request.problem.model_dump(mode="json"),
+            history=history,
         )
 
-    async def _retrieve_documents(self, state: PipelineState) -> PipelineState:
-        problem_description = state["problem"].get("description", "")
-        history_snippets = [message["content"] for message in state.get("history", [])[-3:]]
-        context_chunks = await self._retriever.search(
-            slug=state["problem"]["slug"],
-            query=state["question"],
-            additional_context=[problem_description, *history_snippets] if problem_description else history_snippets,
+    @staticmethod
+    def _dump_history(request: ChatRequest) -> List[Dict[str, str]]:
+        # One serializer pass, shared by the cache key and the pipeline state.
+        return request.model_dump(mode="json", include={"history"})["history"]
+
+    async def _embed_inputs(self, state: PipelineState) -> List[float]:
+        texts = [state.question]
+        weights = [QUESTION_WEIGHT]
+
+        problem_description = state.problem.get("description", "")
+        if problem_description:
+            texts.append(problem_description)
+            weights.append(DESCRIPTION_WEIGHT)
+
+        history_snippets = [message["content"] for message in state.history[-3:] if message["content"]]
+        texts.extend(history_snippets)
+        weights.extend([HISTORY_WEIGHT] * len(history_snippets))
+
+        # One embeddings round-trip for the question and its context, fused into a single probe vector.
+        vectors = await self._embeddings.embed_batch(texts)
+        state.question_vector = vectors[0]
+        state.query_vector = fuse_vectors(vectors, weights)
+        return state.query_vector
+
+    @staticmethod
+    def _is_first_turn(state: PipelineState) -> bool:
+        # Follow-up answers depend on the conversation so far, so only opening questions are matched semantically.
+        return not any(message["role"] == "assistant" for message in state.history)
+
+    async def _find_similar_answer(self, state: PipelineState) -> Optional[Dict[str, Any]]:
+        if not self._is_first_turn(state):
+            return None
+        matched_key = self._semantic_cache.lookup(state.problem["slug"], state.question_vector)
+        if matched_key is None:
+            return None
+        return await self._cache.get(matched_key)
+
+    def _remember_answer(self, state: PipelineState, cache_key: str) -> None:
+        if self._is_first_turn(state):
+            self._semantic_cache.add(state.problem["slug"], state.question_vector, cache_key)
+
+    async def _retrieve_documents(self, state: PipelineState, query_vector: Awaitable[List[float]]) -> None:
+        chunks = await self._retriever.search_by_vector(
+            slug=state.problem["slug"],
+            query_vector=query_vector,
         )
-        return {**state, "context": context_chunks}
+        state.context = self._dedupe_chunks(chunks)
 
-    async def _prepare_prompt_inputs(self, request: ChatRequest) -> PipelineState:
-        initial_state: PipelineState = {
-            "question": request.question,
-            "problem": request.problem.model_dump(),
-            "history": [message.model_dump() for message in request.history],
-        }
-        state_with_context = await self._retrieve_documents(initial_state)
-        return state_with_context
+    async def _prepare_context(self, state: PipelineState) -> Optional[Dict[str, Any]]:
+        """
+        Embed the inputs and retrieve context, or return a similar cached answer instead.
+
+        Retrieval starts alongside the embeddings call so the DB checkout overlaps it,
+        and is cancelled if the semantic cache answers first. The LLM connection is
+        warmed from the start: a handshake outlasts the lookups, and a wasted ping on a
+        semantic hit is cheaper than a cold answer call.
+        """
+
+        self._warm_llm_connection()
+        embedding = asyncio.create_task(self._embed_inputs(state))
+        retrieval = asyncio.create_task(self._retrieve_documents(state, embedding))
+        try:
+            await embedding
+            cached = await self._find_similar_answer(state)
+            if cached:
+                return cached
+            await retrieval
+            return None
+        finally:
+            retrieval.cancel()
+            await asyncio.gather(retrieval, return_exceptions=True)
+
+    @staticmethod
+    def _dedupe_chunks(chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        # The same text indexed twice only costs prompt tokens; keep the closest copy.
+        seen: set[str] = set()
+        unique: List[DocumentChunk] = []
+        for chunk in chunks:
+            if chunk.content_hash not in seen:
+                seen.add(chunk.content_hash)
+                unique.append(chunk)
+        return unique
 
     @staticmethod
     def _build_prompt_variables(state: PipelineState) -> Dict[str, str]:
-        context_snippets = "\n\n".join(chunk.to_prompt_snippet() for chunk in state.get("context", [])) or "No extra context available."
-        history_lines = "\n".join(f"{message['role'].title()}: {message['content']}" for message in state.get("history", [])) or "No prior conversation."
+        # str.join presizes from a list but must first materialise a generator.
+        context_snippets = "\n\n".join([chunk.prompt_snippet for chunk in state.context]) or "No extra context available."
+        history_lines = "\n".join([f"{message['role'].title()}: {message['content']}" for message in state.history]) or "No prior conversation."
         return {
-            "problem_title": state["problem"]["title"],
-            "difficulty": state["problem"]["difficulty"],
-            "url": state["problem"].get("url", "n/a"),
-            "problem_description": state["problem"].get("description", "Not provided."),
+            "problem_title": state.problem["title"],
+            "difficulty": state.problem["difficulty"],
+            "url": state.problem.get("url", "n/a"),
+            "problem_description": state.problem.get("description", "Not provided."),
             "context": context_snippets,
             "history": history_lines,
-            "question": state["question"],
+            "question": state.question,
         }
 
     @staticmethod
@@ -142,44 +326,99 @@ class RAGPipeline:
         return [
             SourceDocument(
                 title=chunk.title,
-                snippet=chunk.content[:500],
+                snippet=chunk.snippet,
                 metadata={**chunk.metadata, "distance": round(chunk.distance, 4)},
             )
             for chunk in chunks
         ]
 
-    async def _run_answer_chain(self, state: PipelineState) -> str:
-        variables = self._build_prompt_variables(state)
-        response = await (self._answer_prompt | self._answer_llm).ainvoke(variables)
-        return response.content.strip()
-
-    async def _run_summary_chain(self, state: PipelineState, answer: str) -> str:
-        summary_response = await (
-            self._summary_prompt
-            | self._summary_llm
-        ).ainvoke(
-            {
-                "problem_title": state["problem"]["title"],
-                "difficulty": state["problem"]["difficulty"],
-                "question": state["question"],
-                "answer": answer,
-            }
-        )
-        return summary_response.content.strip()
+    def _warm_llm_connection(self) -> None:
+        """
+        Reopen the chat client's connection in the background while embedding and retrieval run.
+
+        Only fires when the client has been idle long enough for its pooled connection to
+        have closed, so the TCP and TLS handshake is off the time-to-first-token path.
+        """
+
+        # A ping already in flight covers concurrent requests too.
+        if self._background or time.monotonic() - self._llm_last_used < LLM_WARMUP_IDLE_SECONDS:
+            return
+        task = asyncio.create_task(self._ping_llm())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _ping_llm(self) -> None:
+        client = getattr(self._llm, "root_async_client", None)
+        if client is None:
+            return
+        try:
+            await client.models.retrieve(self._llm.model_name)
+        except Exception:  # noqa: BLE001 - best effort; the answer request reports real failures
+            logger.debug("LLM connection warm-up failed", exc_info=True)
+        finally:
+            self._llm_last_used = time.monotonic()
+
+    async def aclose(self) -> None:
+        """
+        Cancel warm-up pings still in flight; called on application shutdown.
+        """
+
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def _build_messages(self, state: PipelineState) -> List[BaseMessage]:
+        # Built directly rather than through a prompt template: the system message is a constant.
+        human_prompt = _ANSWER_HUMAN_PROMPT.format(**self._build_prompt_variables(state))
+        return [ANSWER_SYSTEM_MESSAGE, HumanMessage(content=human_prompt)]
+
+    @staticmethod
+    def _llm_kwargs(state: PipelineState) -> Dict[str, str]:
+        # Requests for the same problem share a long prompt prefix; a stable ``user``
+        # lets OpenAI route them to the same cache.
+        return {"user": state.problem["slug"]}
+
+    async def _run_answer_chain(self, state: PipelineState) -> Tuple[str, str]:
+        try:
+            response = await self._llm.ainvoke(self._build_messages(state), **self._llm_kwargs(state))
+        finally:
+            # Idle time is measured from when the pooled connection was last released.
+            self._llm_last_used = time.monotonic()
+        return split_answer(response.content)
+
+    async def _stream_answer(self, state: PipelineState, splitter: AnswerStreamSplitter) -> AsyncIterator[str]:
+        coerce_content = _coerce_content
+        try:
+            async for chunk in self._llm.astream(self._build_messages(state), **self._llm_kwargs(state)):
+                content = chunk.content
+                # Plain-text chunks are the norm; everything else takes the out-of-line path.
+                content_piece = content if content.__class__ is str else coerce_content(chunk)
+
+                answer_piece = splitter.feed(content_piece) if content_piece else ""
+                if answer_piece:
+                    yield answer_piece
+        finally:
+            self._llm_last_used = time.monotonic()
+
+        answer_piece = splitter.finish()
+        if answer_piece:
+            yield answer_piece
 
     async def run(self, request: ChatRequest) -> ChatResponse:
-        cache_key = self._cache.build_key(
-            request.problem.slug,
-            {"question": request.question, "history": [message.model_dump() for message in request.history]},
-        )
+        history = self._dump_history(request)
+        cache_key = self._cache.build_key(request.problem.slug, {"question": request.question, "history": history})
         cached = await self._cache.get(cache_key)
         if cached:
             return ChatResponse(**cached)
 
-        state = await self._prepare_prompt_inputs(request)
-        answer_text = await self._run_answer_chain(state)
-        summary_text = await self._run_summary_chain(state, answer_text)
-        sources = self._build_sources(state.get("context", []))
+        # Stages fill in this one state object in place rather than copying it per step.
+        state = self._initial_state(request, history)
+        cached = await self._prepare_context(state)
+        if cached:
+            return ChatResponse(**cached)
+
+        answer_text, summary_text = await self._run_answer_chain(state)
+        sources = self._build_sources(state.context)
 
         response_payload = ChatResponse(
             answer=answer_text,
@@ -187,49 +426,42 @@ class RAGPipeline:
             sources=sources,
         )
 
-        await self._cache.set(cache_key, response_payload.model_dump())
+        await self._cache.set(cache_key, response_payload.model_dump(mode="json"))
+        self._remember_answer(state, cache_key)
         return response_payload
 
     async def stream(self, request: ChatRequest) -> AsyncIterator[Dict[str, Any]]:
-        cache_key = self._cache.build_key(
-            request.problem.slug,
-            {"question": request.question, "history": [message.model_dump() for message in request.history]},
-        )
+        history = self._dump_history(request)
+        cache_key = self._cache.build_key(request.problem.slug, {"question": request.question, "history": history})
         cached = await self._cache.get(cache_key)
         if cached:
             yield {"type": "cached", "payload": cached}
             return
 
-        state = await self._prepare_prompt_inputs(request)
-        sources = self._build_sources(state.get("context", []))
-        yield {"type": "sources", "sources": [source.model_dump() for source in sources]}
-
-        variables = self._build_prompt_variables(state)
-
-        answer_parts: List[str] = []
-        async for chunk in (self._answer_prompt | self._answer_llm).astream(variables):
-            content_piece = ""
-            if isinstance(chunk.content, str):
-                content_piece = chunk.content
-            elif isinstance(chunk.content, list):
-                content_piece = "".join(
-                    part.get("text", "")
-                    if isinstance(part, dict)
-                    else getattr(part, "text", str(part))
-                    for part in chunk.content
-                )
-            else:
-                content_piece = getattr(chunk, "text", "") or ""
-
-            if not content_piece:
-                continue
-            answer_parts.append(content_piece)
-            yield {"type": "token", "token": content_piece}
-
-        answer_text = "".join(answer_parts).strip()
-        summary_text = await self._run_summary_chain(state, answer_text)
+        state = self._initial_state(request, history)
+        cached = await self._prepare_context(state)
+        if cached:
+            yield {"type": "cached", "payload": cached}
+            return
+
+        # Dumped once: the same list goes out in the sources event and into the cached payload.
+        source_payload = [source.model_dump(mode="json") for source in self._build_sources(state.context)]
+        yield {"type": "sources", "sources": source_payload}
+
+        splitter = AnswerStreamSplitter()
+        tokens = batch_tokens(self._stream_answer(state, splitter))
+        try:
+            async for token in tokens:
+                yield {"type": "token", "token": token}
+        finally:
+            await tokens.aclose()
+
+        answer_text = splitter.answer
+        summary_text = splitter.summary
         yield {"type": "summary", "summary": summary_text}
 
-        response_payload = ChatResponse(answer=answer_text, summary=summary_text, sources=sources)
-        await self._cache.set(cache_key, response_payload.model_dump())
-        yield {"type": "end", "payload": response_payload.model_dump()}
+        payload = ChatResponse.model_construct(answer=answer_text, summary=summary_text).model_dump(mode="json")
+        payload["sources"] = source_payload
+        await self._cache.set(cache_key, payload)
+        self._remember_answer(state, cache_key)
+        yield {"type": "end", "payload": payload}
@@ -1,63 +1,111 @@
 from __future__ import annotations
 
+import asyncio
+import inspect
 from dataclasses import dataclass
-from typing import Any, Dict, List, Sequence
+from typing import Any, Awaitable, Dict, List, Sequence
 
-from sqlalchemy import Select, delete, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, bindparam, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.models import Document
 from app.services.embeddings import EmbeddingService
 
+SOURCE_SNIPPET_CHARS = 500
+
 
 @dataclass
 class DocumentChunk:
     title: str
-    content: str
+    snippet: str
     metadata: Dict[str, Any]
     distance: float
-
-    def to_prompt_snippet(self) -> str:
-        source = self.metadata.get("source", "LeetCode")
-        return f"[{source}] {self.title}\n{self.content}"
+    prompt_snippet: str
+    content_hash: str
 
 
 class DocumentRetriever:
-    def __init__(self, session: AsyncSession, embeddings: EmbeddingService, top_k: int = 4) -> None:
-        self._session = session
-        self._embeddings = embeddings
-        self._top_k = top_k
-
-    async def search(self, slug: str, query: str, additional_context: Sequence[str] | None = None) -> List[DocumentChunk]:
-        augmented_query = query
-        if additional_context:
-            augmented_query = f"{query}\n\n" + "\n\n".join(additional_context)
+    """
+    Vector search and ingestion over the ``documents`` table.
 
-        query_vector = await self._embeddings.embed_query(augmented_query)
+    Each call opens its own short-lived session, so a connection is held only for
+    the query itself and not while callers wait on embeddings or the LLM. Ingestion
+    uses a separate session factory (and pool) from chat lookups.
+    """
 
-        stmt: Select[tuple[Document, float]] = (
-            select(
-                Document,
-                Document.embedding.cosine_distance(query_vector).label("distance"),
-            )
-            .where(Document.slug == slug)
-            .order_by(Document.embedding.cosine_distance(query_vector))
-            .limit(self._top_k)
+    def __init__(
+        self,
+        embeddings: EmbeddingService,
+        session_factory: async_sessionmaker[AsyncSession],
+        ingest_session_factory: async_sessionmaker[AsyncSession],
+        top_k: int = 4,
+    ) -> None:
+        self._embeddings = embeddings
+        self._session_factory = session_factory
+        self._ingest_session_factory = ingest_session_factory
+        self._search_stmt = self._build_search_statement(top_k)
+
+    @staticmethod
+    def _build_search_statement(top_k: int) -> Select[tuple[str, str, Dict[str, Any], str, str, float]]:
+        """
+        Build the vector search once; each call only binds ``slug`` and ``query_vector``.
+        """
+
+        # An exact scan: the slug filter leaves only that problem's few chunks to rank.
+        distance = Document.embedding.cosine_distance(
+            bindparam("query_vector", type_=Document.embedding.type),
+        ).label("distance")
+        # Formatted by Postgres while it reads the row, ready to drop into the prompt.
+        prompt_snippet = func.format(
+            "[%s] %s\n%s",
+            func.coalesce(Document.metadata_json["source"].astext, "LeetCode"),
+            Document.title,
+            Document.content,
+        ).label("prompt_snippet")
+        # Sources only show the start of a chunk; the full text travels inside prompt_snippet.
+        snippet = func.substring(Document.content, 1, SOURCE_SNIPPET_CHARS).label("snippet")
+        content_hash = func.md5(Document.content).label("content_hash")
+        # Ordering by the label sorts on the selected column rather than repeating the expression.
+        return (
+            select(Document.title, snippet, Document.metadata_json, prompt_snippet, content_hash, distance)
+            .where(Document.slug == bindparam("slug"))
+            .order_by(distance)
+            .limit(top_k)
         )
 
-        result = await self._session.execute(stmt)
-        chunks: List[DocumentChunk] = []
-        for document, distance in result.all():
-            chunks.append(
-                DocumentChunk(
-                    title=document.title,
-                    content=document.content,
-                    metadata=document.metadata_json or {},
-                    distance=float(distance or 0.0),
-                ),
+    async def search_by_vector(
+        self,
+        slug: str,
+        query_vector: Sequence[float] | Awaitable[Sequence[float]],
+    ) -> List[DocumentChunk]:
+        """
+        Search with a ready vector, or with an awaitable still computing one; in that case
+        the pool checkout and pre-ping overlap with the embeddings call.
+        """
+
+        async with self._session_factory() as session:
+            if inspect.isawaitable(query_vector):
+                # Both settle before the session closes, even when one of them fails.
+                outcomes = await asyncio.gather(query_vector, session.connection(), return_exceptions=True)
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                query_vector = outcomes[0]
+            return await self._search(session, slug, query_vector)
+
+    async def _search(self, session: AsyncSession, slug: str, query_vector: Sequence[float]) -> List[DocumentChunk]:
+        result = await session.execute(self._search_stmt, {"slug": slug, "query_vector": query_vector})
+        return [
+            DocumentChunk(
+                title=title,
+                snippet=snippet,
+                metadata=metadata or {},
+                distance=float(distance or 0.0),
+                prompt_snippet=prompt_snippet,
+                content_hash=content_hash,
             )
-
-        return chunks
+            for title, snippet, metadata, prompt_snippet, content_hash, distance in result.all()
+        ]
 
     async def upsert(
         self,
@@ -71,16 +119,19 @@ class DocumentRetriever:
         contents = [content for _, content, _ in chunks]
         embeddings = await self._embeddings.embed_documents(contents)
 
-        await self._session.execute(delete(Document).where(Document.slug == slug))
-
-        for index, ((chunk_title, content, metadata), vector) in enumerate(zip(chunks, embeddings, strict=True)):
-            document = Document(
-                slug=slug,
-                title=f"{base_title} | {chunk_title}" if chunk_title else base_title,
-                content=content,
-                metadata_json={**metadata, "chunk_index": index, "base_title": base_title},
-                embedding=vector,
-            )
-            self._session.add(document)
-
-        await self._session.commit()
+        rows = [
+            {
+                "slug": slug,
+                "title": f"{base_title} | {chunk_title}" if chunk_title else base_title,
+                "content": content,
+                "metadata_json": {**metadata, "chunk_index": index, "base_title": base_title},
+                "embedding": vector,
+            }
+            for index, ((chunk_title, content, metadata), vector) in enumerate(zip(chunks, embeddings, strict=True))
+        ]
+
+        # Delete and re-insert in one transaction; the insert is a single executemany batch.
+        async with self._ingest_session_factory() as session:
+            await session.execute(delete(Document).where(Document.slug == slug))
+            await session.execute(insert(Document), rows)
+            await session.commit()
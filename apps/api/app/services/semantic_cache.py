@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+class _SlugIndex:
+    """
+    Flat inner-product index over the question vectors cached for one problem.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._vectors: np.ndarray | None = None
+        self._keys: List[str] = []
+        self._last_used: List[int] = []
+        self._expires_at: List[float] = []
+
+    def search(self, vector: np.ndarray, threshold: float, tick: int, now: float) -> Optional[str]:
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ vector
+        scores[np.asarray(self._expires_at) <= now] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        self._last_used[best] = tick
+        return self._keys[best]
+
+    def add(self, vector: np.ndarray, cache_key: str, tick: int, now: float, expires_at: float) -> None:
+        if cache_key in self._keys:
+            row = self._keys.index(cache_key)
+        elif len(self._keys) >= self._capacity:
+            # Expired rows are reused before the least recently used live one.
+            expired = np.asarray(self._expires_at) <= now
+            row = int(np.argmin(np.where(expired, -1, self._last_used)))
+        else:
+            row_vector = vector[np.newaxis, :]
+            self._vectors = row_vector if self._vectors is None else np.vstack((self._vectors, row_vector))
+            self._keys.append(cache_key)
+            self._last_used.append(tick)
+            self._expires_at.append(expires_at)
+            return
+
+        self._vectors[row] = vector
+        self._keys[row] = cache_key
+        self._last_used[row] = tick
+        self._expires_at[row] = expires_at
+
+
+class SemanticCache:
+    """
+    Maps question embeddings to exact-match chat cache keys so paraphrased
+    questions on the same problem can reuse an earlier answer.
+
+    Only keys are held here; the responses themselves stay in
+    :class:`~app.services.cache.CacheService`. Entries expire after ``ttl_seconds``,
+    matching the response TTL so a match never points at an evicted answer.
+    """
+
+    def __init__(self, threshold: float, max_entries_per_slug: int, max_slugs: int, ttl_seconds: float) -> None:
+        self._threshold = threshold
+        self._ttl_seconds = ttl_seconds
+        self._max_entries_per_slug = max_entries_per_slug
+        self._max_slugs = max_slugs
+        self._indexes: OrderedDict[str, _SlugIndex] = OrderedDict()
+        self._tick = 0
+
+    @staticmethod
+    def _normalise(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, slug: str, vector: Sequence[float]) -> Optional[str]:
+        index = self._indexes.get(slug)
+        if index is None:
+            return None
+        self._tick += 1
+        self._indexes.move_to_end(slug)
+        return index.search(self._normalise(vector), self._threshold, self._tick, time.monotonic())
+
+    def add(self, slug: str, vector: Sequence[float], cache_key: str) -> None:
+        index = self._indexes.get(slug)
+        if index is None:
+            index = self._indexes[slug] = _SlugIndex(self._max_entries_per_slug)
+            if len(self._indexes) > self._max_slugs:
+                self._indexes.popitem(last=False)
+        self._tick += 1
+        self._indexes.move_to_end(slug)
+        now = time.monotonic()
+        index.add(self._normalise(vector), cache_key, self._tick, now, now + self._ttl_seconds)
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.cache import CacheService
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+def test_cache_round_trips_compressed_payload_and_serves_repeats_from_l1():
+    client = FakeRedis()
+    payload = {"answer": "Use a hash map.", "summary": "- O(n)", "sources": [{"title": "Two Sum", "metadata": {}}]}
+
+    async def scenario():
+        writer = CacheService(client)
+        await writer.set("chat:two-sum:abc", payload)
+        assert isinstance(client.store["chat:two-sum:abc"], bytes)
+
+        reader = CacheService(client)
+        first = await reader.get("chat:two-sum:abc")
+        second = await reader.get("chat:two-sum:abc")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == payload
+    assert second == payload
+    assert client.gets == 1
+
+
+def test_semantic_cache_matches_paraphrases_and_evicts_least_recently_used():
+    cache = SemanticCache(threshold=0.95, max_entries_per_slug=2, max_slugs=8, ttl_seconds=300)
+    cache.add("two-sum", [1.0, 0.0, 0.0], "chat:two-sum:a")
+    cache.add("two-sum", [0.0, 1.0, 0.0], "chat:two-sum:b")
+
+    assert cache.lookup("two-sum", [0.99, 0.05, 0.0]) == "chat:two-sum:a"
+    assert cache.lookup("two-sum", [0.6, 0.6, 0.0]) is None
+    assert cache.lookup("3sum", [1.0, 0.0, 0.0]) is None
+
+    cache.add("two-sum", [0.0, 0.0, 1.0], "chat:two-sum:c")
+
+    assert cache.lookup("two-sum", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("two-sum", [1.0, 0.0, 0.0]) == "chat:two-sum:a"
+
+
+def test_semantic_cache_entries_expire_with_the_response_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=0.95, max_entries_per_slug=1, max_slugs=8, ttl_seconds=300)
+    cache.add("two-sum", [1.0, 0.0], "chat:two-sum:a")
+
+    assert cache.lookup("two-sum", [1.0, 0.0]) == "chat:two-sum:a"
+
+    now[0] += 301
+    assert cache.lookup("two-sum", [1.0, 0.0]) is None
+
+    cache.add("two-sum", [0.0, 1.0], "chat:two-sum:b")
+    assert cache.lookup("two-sum", [0.0, 1.0]) == "chat:two-sum:b"
@@ -0,0 +1,42 @@
+import asyncio
+
+import orjson
+
+from app.api.endpoints.chat import coalesce_ndjson
+
+
+async def _collect(events):
+    return [chunk async for chunk in coalesce_ndjson(events)]
+
+
+def test_coalesce_ndjson_grows_batches_and_keeps_every_event():
+    async def events():
+        for index in range(20):
+            yield {"type": "token", "token": f"t{index}"}
+
+    chunks = asyncio.run(_collect(events()))
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [1, 3, 9, 7]
+    lines = b"".join(chunks).splitlines()
+    assert [orjson.loads(line)["token"] for line in lines] == [f"t{index}" for index in range(20)]
+
+
+def test_coalesce_ndjson_closes_the_upstream_generator_when_closed_early():
+    closed = []
+
+    async def events():
+        try:
+            while True:
+                await asyncio.sleep(0)
+                yield {"type": "token", "token": "t"}
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        chunks = coalesce_ndjson(events())
+        await anext(chunks)
+        await chunks.aclose()
+
+    asyncio.run(scenario())
+
+    assert closed == [True]
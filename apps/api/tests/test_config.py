@@ -9,6 +9,8 @@ def test_cors_origin_parsing(monkeypatch):
 
     assert settings.cors_origins == ["http://localhost:5173"]
     assert settings.cors_origin_regex == r"^chrome\-extension://.*$"
+    assert settings.cors_origin_regex_compiled.match("chrome-extension://abcdef")
+    assert settings.cors_origin_regex_compiled.match("http://localhost:5173") is None
 
 
 def test_cache_key_is_deterministic():
@@ -19,3 +21,10 @@ def test_cache_key_is_deterministic():
     key_b = CacheService.build_key("two-sum", payload_b)
 
     assert key_a == key_b
+
+
+def test_cache_key_ignores_question_case_and_spacing():
+    key_a = CacheService.build_key("two-sum", {"question": "  How do I   start? ", "history": []})
+    key_b = CacheService.build_key("two-sum", {"question": "how do i start?", "history": []})
+
+    assert key_a == key_b
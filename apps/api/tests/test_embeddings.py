@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import embeddings
+from app.services.embeddings import EmbeddingService, _MicroBatcher
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+class FakeEmbedder:
+    def __init__(self, **_):
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 0.5, 1 / 3] for text in texts]
+
+
+def test_micro_batcher_shares_one_upstream_call_between_concurrent_callers():
+    calls = []
+
+    async def embed(texts):
+        calls.append(list(texts))
+        return [[float(index)] for index in range(len(texts))]
+
+    async def scenario():
+        batcher = _MicroBatcher(embed, max_batch=8, max_wait=0.01)
+        return await asyncio.gather(*(batcher.submit(text) for text in ["a", "b", "c"]))
+
+    assert asyncio.run(scenario()) == [[0.0], [1.0], [2.0]]
+    assert calls == [["a", "b", "c"]]
+
+
+@pytest.mark.parametrize(
+    ("vectors", "error"),
+    [(ValueError("upstream down"), ValueError), ([[1.0]], RuntimeError)],
+)
+def test_micro_batcher_fails_every_caller_when_the_batch_fails(vectors, error):
+    async def embed(texts):
+        if isinstance(vectors, Exception):
+            raise vectors
+        return vectors
+
+    async def scenario():
+        batcher = _MicroBatcher(embed, max_batch=8, max_wait=0.01)
+        calls = (batcher.submit(text) for text in ["a", "b", "c"])
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), timeout=1)
+
+    outcomes = asyncio.run(scenario())
+
+    assert len(outcomes) == 3
+    assert all(isinstance(outcome, error) for outcome in outcomes)
+
+
+def test_micro_batcher_releases_callers_when_a_flush_is_cancelled():
+    async def embed(texts):
+        await asyncio.Event().wait()
+
+    async def scenario():
+        batcher = _MicroBatcher(embed, max_batch=8, max_wait=0.01)
+        callers = [asyncio.create_task(batcher.submit(text)) for text in ["a", "b"]]
+        await asyncio.sleep(0.05)
+        for task in list(batcher._in_flight):
+            task.cancel()
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), timeout=1)
+
+    outcomes = asyncio.run(scenario())
+
+    assert all(isinstance(outcome, asyncio.CancelledError) for outcome in outcomes)
+
+
+def test_query_embeddings_are_shared_through_redis_as_float16(monkeypatch):
+    monkeypatch.setattr(embeddings.settings, "embedding_backend", "openai")
+    monkeypatch.setattr(embeddings.settings, "openai_api_key", "test-key")
+    monkeypatch.setattr(embeddings, "OpenAIEmbeddings", FakeEmbedder)
+    client = FakeRedis()
+
+    async def scenario():
+        writer = EmbeddingService(redis=client)
+        first = await writer.embed_query("two sum")
+        reader = EmbeddingService(redis=client)
+        second = await reader.embed_query("two sum")
+        return writer, reader, first, second
+
+    writer, reader, first, second = asyncio.run(scenario())
+
+    (packed,) = client.store.values()
+    assert len(packed) == 3 * np.dtype(np.float16).itemsize
+    assert writer._embedder.calls == [["two sum"]]
+    assert reader._embedder.calls == []
+    assert np.allclose(second, first, atol=1e-3)
@@ -0,0 +1,77 @@
+import asyncio
+import math
+from types import SimpleNamespace
+
+from app.services.rag import (
+    LLM_WARMUP_IDLE_SECONDS,
+    AnswerStreamSplitter,
+    RAGPipeline,
+    batch_tokens,
+    fuse_vectors,
+    split_answer,
+)
+
+
+def test_fuse_vectors_weights_question_and_normalises():
+    fused = fuse_vectors([[1.0, 0.0], [0.0, 1.0]], [1.0, 0.3])
+
+    assert math.isclose(math.hypot(*fused), 1.0, rel_tol=1e-6)
+    assert fused[0] > fused[1] > 0
+
+
+def test_answer_stream_splitter_never_emits_the_summary_delimiter():
+    completion = "Use a hash map --- one pass.\n\n---SUMMARY---\n- Store complements\n- O(n) time"
+    pieces = [completion[i : i + 4] for i in range(0, len(completion), 4)]
+
+    splitter = AnswerStreamSplitter()
+    emitted = "".join(splitter.feed(piece) for piece in pieces) + splitter.finish()
+
+    assert emitted.strip() == "Use a hash map --- one pass."
+    assert (splitter.answer, splitter.summary) == split_answer(completion)
+    assert splitter.summary == "- Store complements\n- O(n) time"
+
+
+def test_batch_tokens_merges_queued_pieces_and_closes_the_source():
+    closed = []
+
+    async def pieces():
+        try:
+            for index in range(12):
+                yield f"p{index:02d}-"
+        finally:
+            closed.append(True)
+
+    async def collect():
+        return [token async for token in batch_tokens(pieces())]
+
+    tokens = asyncio.run(collect())
+
+    assert "".join(tokens) == "".join(f"p{index:02d}-" for index in range(12))
+    assert len(tokens) < 12
+    assert closed == [True]
+
+
+def test_llm_warmup_pings_once_until_the_connection_idles():
+    pinged = []
+
+    async def retrieve(model):
+        await asyncio.sleep(0)
+        pinged.append(model)
+
+    llm = SimpleNamespace(model_name="gpt-test", root_async_client=SimpleNamespace(models=SimpleNamespace(retrieve=retrieve)))
+    pipeline = RAGPipeline(retriever=None, embeddings=None, cache=None, semantic_cache=None, llm=llm)
+
+    async def scenario():
+        pipeline._warm_llm_connection()
+        pipeline._warm_llm_connection()  # the first ping is still in flight
+        await asyncio.gather(*pipeline._background)
+        pipeline._warm_llm_connection()  # the connection was just used
+        assert not pipeline._background
+
+        pipeline._llm_last_used -= LLM_WARMUP_IDLE_SECONDS
+        pipeline._warm_llm_connection()
+        await asyncio.gather(*pipeline._background)
+
+    asyncio.run(scenario())
+
+    assert pinged == ["gpt-test", "gpt-test"]